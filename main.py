@@ -5,32 +5,109 @@
 import logging
 import os
 import json
-import re
+import secrets
+import time
 import asyncio
-from typing import Optional, List
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from io import BytesIO
+from typing import Optional, List, Dict, Tuple, Union, Callable, Awaitable, Any
 
+import diskcache
 import httpx
-from bs4 import BeautifulSoup
-from fastapi import FastAPI, HTTPException, Query
+from lxml import etree, html
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from cachetools import TTLCache
 
+from parseo import (
+    DatosArticulo,
+    OPCIONES_XML_INDICE,
+    XPATH_DIV_PARTE,
+    XPATH_TEXTO_VISIBLE,
+    buscar_id_en_fragmento,
+    construir_articulos,
+    extraer_articulos,
+    indexar_articulos,
+    normalizar_articulo,
+    nuevo_parser_articulos,
+    recortar_texto,
+)
+
 # --- Logging ---
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     force=True,
 )
 logger = logging.getLogger(__name__)
 logger.info("API v2.3.2 INICIANDO...")
 
-# --- FastAPI & CORS ---
+# --- Recursos compartidos: pool de parseo y cliente HTTP hacia LeyChile/BCN ---
+pool_procesos: Optional[ProcessPoolExecutor] = None
+# Procesos de parseo por worker de Uvicorn (total = workers × PARSEO_PROCESOS)
+PARSEO_PROCESOS = int(os.getenv("PARSEO_PROCESOS", 2))
+
+def obtener_pool() -> ProcessPoolExecutor:
+    global pool_procesos
+    if pool_procesos is None:
+        # Sin fork: el proceso del servidor tiene hilos (event loop, threadpool de FastAPI)
+        metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        pool_procesos = ProcessPoolExecutor(
+            max_workers=max(1, min(PARSEO_PROCESOS, os.cpu_count() or 1)),
+            mp_context=multiprocessing.get_context(metodo),
+        )
+    return pool_procesos
+
+def reiniciar_pool(roto: ProcessPoolExecutor) -> None:
+    """Descarta un pool caído (p. ej. un hijo muerto por OOM); el próximo uso crea otro."""
+    global pool_procesos
+    if pool_procesos is roto:
+        pool_procesos = None
+    roto.shutdown(wait=False, cancel_futures=True)
+
+def crear_cliente_http() -> httpx.AsyncClient:
+    """Cliente HTTP compartido; HTTP_TRANSPORT=aiohttp usa aiohttp bajo la API de httpx."""
+    opciones = dict(
+        timeout=httpx.Timeout(10.0),
+        headers={"User-Agent": "consulta-leyes-chile/2.3.2"},
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+    )
+    if os.getenv("HTTP_TRANSPORT", "").lower() == "aiohttp":
+        # Dependencia opcional: pip install httpx-aiohttp
+        from httpx_aiohttp import HttpxAiohttpClient
+        return HttpxAiohttpClient(**opciones)
+    return httpx.AsyncClient(http2=True, **opciones)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global ids_en_disco, invalidaciones_en_disco
+    ids_en_disco = abrir_ids_en_disco()
+    invalidaciones_en_disco = diskcache.Cache(os.path.join(cache_dir, "invalidaciones"))
+    obtener_pool()
+    # Un solo cliente por worker: conexiones keep-alive reutilizadas entre requests
+    app.state.http = crear_cliente_http()
+    yield
+    await app.state.http.aclose()
+    if pool_procesos is not None:
+        reiniciar_pool(pool_procesos)
+    ids_en_disco.close()
+    invalidaciones_en_disco.close()
+
+def cliente_http(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http
+
+# --- FastAPI, CORS y compresión ---
 app = FastAPI(
     title="API de Consulta de Leyes Chilenas",
     version="2.3.2",
     description="Consulta leyes chilenas (XML) y artículos (HTML) de LeyChile.cl",
     servers=[{"url": "https://consulta-leyes-chile.onrender.com", "description": "Producción"}],
+    lifespan=lifespan,
 )
 app.add_middleware(
     CORSMiddleware,
@@ -39,32 +116,54 @@ app.add_middleware(
     allow_headers=["*"],
     allow_credentials=True,
 )
+# Las respuestas de /ley y /leyes pueden traer decenas de KB de texto
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 # --- Caché ---
-cache_id_norma = TTLCache(maxsize=100, ttl=3600)
-cache_xml_ley  = TTLCache(maxsize=50,  ttl=3600)
+base_dir = os.path.dirname(os.path.abspath(__file__))
+# Las leyes varían 100× en tamaño: cache_articulos se acota por caracteres de texto, no por entradas
+MAX_CACHE_ARTICULOS = 50_000_000
+TTL_ARTICULOS = 3600
+
+# (artículos, índice por articulo_id_interno, time.time() al iniciar la descarga)
+LeyCacheada = Tuple[List[DatosArticulo], Dict[str, DatosArticulo], float]
+
+def tamano_ley(ley: LeyCacheada) -> int:
+    return sum(len(art["texto"]) for art in ley[0]) or 1
+
+cache_id_norma  = TTLCache(maxsize=1024, ttl=86400)
+cache_articulos = TTLCache(maxsize=MAX_CACHE_ARTICULOS, ttl=TTL_ARTICULOS, getsizeof=tamano_ley)
+# Persistente entre reinicios (y compartida entre workers): numero_ley -> IdNorma.
+# Se abre en el lifespan, así importar main (tests, hijos del pool) no toca el disco.
+cache_dir = os.getenv("CACHE_DIR", os.path.join(base_dir, "cache"))
+ids_en_disco: Optional[diskcache.Cache] = None
+TTL_ID_DISCO = 30 * 86400
+# IdNorma -> instante de la última invalidación; cada worker lo consulta al usar su caché
+invalidaciones_en_disco: Optional[diskcache.Cache] = None
+
+# Descargas en curso por clave: las consultas concurrentes esperan la misma tarea
+ids_en_vuelo: Dict[str, "asyncio.Task[Any]"] = {}
+articulos_en_vuelo: Dict[str, "asyncio.Task[Any]"] = {}
 
 # --- Fallback IDs ---
-try:
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    with open(os.path.join(base_dir, "fallbacks.json"), encoding="utf-8") as f:
-        fallback_ids = json.load(f)
-    logger.info("Fallbacks cargados exitosamente.")
-except Exception:
-    fallback_ids = {}
-    logger.warning("No se cargaron fallbacks.")
+def abrir_ids_en_disco() -> diskcache.Cache:
+    """Abre la caché de IdNorma en disco y la siembra con fallbacks.json."""
+    cache = diskcache.Cache(os.path.join(cache_dir, "ids"))
+    try:
+        with open(os.path.join(base_dir, "fallbacks.json"), encoding="utf-8") as f:
+            fallback_ids = json.load(f)
+        logger.info("Fallbacks cargados exitosamente.")
+    except Exception:
+        fallback_ids = {}
+        logger.warning("No se cargaron fallbacks.")
+    for clave_fallback, id_fallback in fallback_ids.items():
+        cache.set(clave_fallback, id_fallback)
+    return cache
 
 # --- Constantes ---
-ROMAN_TO_INT = {
-    "i":1,"ii":2,"iii":3,"iv":4,"v":5,"vi":6,"vii":7,"viii":8,"ix":9,"x":10
-}
-WORDS_TO_INT = {
-    "primero":"1","segundo":"2","tercero":"3","cuarto":"4","quinto":"5",
-    "sexto":"6","séptimo":"7","octavo":"8","noveno":"9","décimo":"10"
-}
-MAX_TEXT_LENGTH = 10000
 MAX_ARTICULOS_RETURNED = 15
-TRUNC_TEXT = "\n\n[... texto truncado ...]"
+MAX_LEYES_POR_CONSULTA = 10
+CHUNK_XML = 64 * 1024
 TRUNC_LIST = f"Mostrando primeros {MAX_ARTICULOS_RETURNED} artículos. La ley tiene más."
 
 # --- Modelos Pydantic ---
@@ -84,6 +183,19 @@ class LeyDetalle(BaseModel):
     total_articulos_originales_en_ley: Optional[int] = None
     nota_truncamiento_lista: Optional[str] = None
 
+class ConsultaLeyes(BaseModel):
+    numeros: List[Union[str, int]]
+
+class LeyesDetalle(BaseModel):
+    leyes: List[LeyDetalle]
+    no_encontradas: List[str] = []
+    con_error: List[str] = []  # LeyChile no respondió: reintentar más tarde
+
+class CacheInvalidada(BaseModel):
+    ley: str
+    id_norma: Optional[str] = None
+    invalidado: bool
+
 class ArticuloHTML(BaseModel):
     idNorma: str
     idParte: str
@@ -92,97 +204,129 @@ class ArticuloHTML(BaseModel):
     texto_html_extraido: str
 
 # --- Helpers ---
-def normalizar_articulo(num_str: Optional[str]) -> str:
-    if not num_str:
-        return "s/n"
-    s = num_str.lower().strip()
-    s = re.sub(r"^(artículo|articulo)\s*", "", s)
-    if s in WORDS_TO_INT:
-        return WORDS_TO_INT[s]
-    if s in ROMAN_TO_INT:
-        return str(ROMAN_TO_INT[s])
-    nums = re.findall(r"(\d+)([a-z]*)", s)
-    comps = [n + t for n, t in nums]
-    return "".join(comps) or s
-
-def limpiar_texto(txt: str) -> str:
-    txt = re.sub(r"[ \t]+", " ", txt)
-    txt = re.sub(r"\n\s*\n+", "\n", txt)
-    return "\n".join(line.strip() for line in txt.splitlines()).strip()
-
-def extraer_referencias(txt: str) -> List[str]:
-    patrones = [r"ley\s+N[°º]?\s*\d+", r"art[íi]culo\s+\d+"]
-    refs = set()
-    for pat in patrones:
-        for m in re.finditer(pat, txt, re.IGNORECASE):
-            refs.add(m.group(0).strip())
-    return sorted(refs)
+def compartir_en_vuelo(
+    en_vuelo: Dict[str, "asyncio.Task[Any]"],
+    clave: str,
+    crear: Callable[[], Awaitable[Any]],
+) -> Awaitable[Any]:
+    """Single-flight: si ya hay una descarga para `clave`, se espera esa en vez de repetirla."""
+    tarea = en_vuelo.get(clave)
+    if tarea is None:
+        tarea = asyncio.ensure_future(crear())
+        en_vuelo[clave] = tarea
+        tarea.add_done_callback(lambda _: en_vuelo.pop(clave, None))
+    # shield: si un cliente se desconecta, la descarga sigue para los demás
+    return asyncio.shield(tarea)
 
 # --- Llamadas a LeyChile ---
+def guardar_id_norma(clave: str, idn: str) -> None:
+    cache_id_norma[clave] = idn
+    ids_en_disco.set(clave, idn, expire=TTL_ID_DISCO)
+
+def clave_ley(n_ley: str) -> str:
+    return n_ley.strip().replace(".", "")
+
 async def obtener_id_norma(n_ley: str, client: httpx.AsyncClient) -> Optional[str]:
-    clave = n_ley.strip().replace(".", "")
+    clave = clave_ley(n_ley)
     if cid := cache_id_norma.get(clave):
         return cid
-    if clave in fallback_ids:
-        cache_id_norma[clave] = fallback_ids[clave]
-        return fallback_ids[clave]
+    if (cid := ids_en_disco.get(clave)) is not None:
+        cache_id_norma[clave] = cid
+        return cid
+    return await compartir_en_vuelo(
+        ids_en_vuelo, clave, lambda: buscar_id_norma(clave, client)
+    )
+
+async def buscar_id_norma(clave: str, client: httpx.AsyncClient) -> Optional[str]:
+    """IdNorma de la ley, o None si el índice no la trae; si LeyChile falla 3 veces, propaga el error."""
     url = f"https://www.leychile.cl/Consulta/indice_normas_busqueda_simple?formato=xml&modo=1&busqueda=ley+{clave}"
+    error: Optional[Exception] = None
     for _ in range(3):
         try:
             r = await client.get(url, timeout=10)
             r.raise_for_status()
-            soup = BeautifulSoup(r.content, "xml")
-            for norma in soup.find_all("Norma"):
-                tag_num = norma.find("Numero")
-                num = tag_num.text.strip().replace(".", "") if tag_num and tag_num.text else ""
+            if idn := buscar_id_en_fragmento(r.content, clave):
+                guardar_id_norma(clave, idn)
+                return idn
+            normas = etree.iterparse(BytesIO(r.content), tag="{*}Norma", **OPCIONES_XML_INDICE)
+            for _, norma in normas:
+                num = (norma.findtext("{*}Numero") or "").strip().replace(".", "")
                 if num == clave:
-                    tag_id = norma.find("IdNorma")
-                    idn = tag_id.text.strip() if tag_id and tag_id.text else None
+                    idn = (norma.findtext("{*}IdNorma") or "").strip()
                     if idn:
-                        cache_id_norma[clave] = idn
+                        guardar_id_norma(clave, idn)
                         return idn
+                norma.clear()
             return None
-        except Exception:
+        except Exception as exc:
+            error = exc
             await asyncio.sleep(1)
-    return None
+    raise error
 
-async def obtener_xml_ley(idn: str, client: httpx.AsyncClient) -> Optional[bytes]:
-    if cxml := cache_xml_ley.get(idn):
-        return cxml
+async def descargar_articulos(idn: str, client: httpx.AsyncClient) -> Optional[List[DatosArticulo]]:
+    """Descarga el XML de la ley y extrae los artículos a medida que llegan los bytes.
+
+    El parseo XML ocurre aquí; la limpieza de cada lote de artículos se envía al
+    pool de procesos para no bloquear el event loop.
+    """
     url = f"https://www.leychile.cl/Consulta/obtxml?opt=7&idNorma={idn}&notaPIE=1"
+    loop = asyncio.get_running_loop()
+    pool = obtener_pool()
+    parser = nuevo_parser_articulos()
+    lotes = []
     try:
-        r = await client.get(url, timeout=15)
-        r.raise_for_status()
-        cache_xml_ley[idn] = r.content
-        return r.content
-    except Exception:
+        async with client.stream("GET", url, timeout=15) as r:
+            r.raise_for_status()
+            async for chunk in r.aiter_bytes(CHUNK_XML):
+                parser.feed(chunk)
+                if crudos := extraer_articulos(parser):
+                    lotes.append(loop.run_in_executor(pool, construir_articulos, crudos))
+        parser.close()
+        if crudos := extraer_articulos(parser):
+            lotes.append(loop.run_in_executor(pool, construir_articulos, crudos))
+        return [art for lote in await asyncio.gather(*lotes) for art in lote]
+    except Exception as exc:
+        for lote in lotes:
+            lote.cancel()
+        if isinstance(exc, BrokenProcessPool):
+            reiniciar_pool(pool)
+        logger.exception("No pude obtener los artículos de la norma %s", idn)
         return None
 
-def extraer_articulos(xml_data: bytes) -> List[Articulo]:
-    soup = BeautifulSoup(xml_data, "lxml-xml")
-    arts = []
-    for ef in soup.find_all("EstructuraFuncional"):
-        if "artículo" not in (ef.get("tipoParte") or "").lower():
-            continue
-        idp = ef.get("idParte")
-        tag_txt = ef.find("Texto")
-        txt = tag_txt.text if tag_txt and tag_txt.text else ""
-        m = re.match(r"^\s*([\w\s]+?)[:\-\.\n](.*)$", txt, re.DOTALL)
-        disp = m.group(1).strip() if m else txt[:20]
-        body = m.group(2).strip() if m else ""
-        norm = normalizar_articulo(disp)
-        limpio = limpiar_texto(body or disp)
-        if len(limpio) > MAX_TEXT_LENGTH:
-            limpio = limpio[:MAX_TEXT_LENGTH] + TRUNC_TEXT
-        refs = extraer_referencias(limpio)
-        arts.append(Articulo(
-            articulo_display=disp,
-            articulo_id_interno=norm,
-            texto=limpio,
-            referencias_legales=refs,
-            id_parte_xml=idp
-        ))
-    return arts
+async def obtener_articulos(idn: str, client: httpx.AsyncClient) -> Optional[LeyCacheada]:
+    """Artículos ya extraídos de la ley (y su índice); evita re-parsear el XML."""
+    if (ley := cache_articulos.get(idn)) is not None:
+        # Otro worker pudo invalidar la ley después de que este la descargara
+        if invalidaciones_en_disco.get(idn, 0.0) < ley[2]:
+            return ley
+        cache_articulos.pop(idn, None)
+    return await compartir_en_vuelo(
+        articulos_en_vuelo, idn, lambda: cargar_articulos(idn, client)
+    )
+
+async def cargar_articulos(idn: str, client: httpx.AsyncClient) -> Optional[LeyCacheada]:
+    inicio = time.time()
+    arts = await descargar_articulos(idn, client)
+    if arts is None:
+        return None
+    ley = (arts, indexar_articulos(arts), inicio)
+    try:
+        cache_articulos[idn] = ley
+    except ValueError:  # una sola ley excede el presupuesto: se sirve sin cachear
+        logger.warning("Ley %s demasiado grande para la caché de artículos", idn)
+    return ley
+
+def armar_detalle(numero: str, idn: str, lista: List[DatosArticulo]) -> LeyDetalle:
+    out = lista if len(lista) <= MAX_ARTICULOS_RETURNED else lista[:MAX_ARTICULOS_RETURNED]
+    nota = TRUNC_LIST if len(lista) > MAX_ARTICULOS_RETURNED else None
+    return LeyDetalle(
+        ley=numero,
+        id_norma=idn,
+        articulos_totales_en_respuesta=len(out),
+        articulos=out,
+        total_articulos_originales_en_ley=len(lista),
+        nota_truncamiento_lista=nota
+    )
 
 # --- Endpoints ---
 
@@ -208,7 +352,8 @@ async def consultar_ley(
     articulo: Optional[str] = Query(
         None,
         description="Artículo (ej. 15, 1 bis)"
-    )
+    ),
+    client: httpx.AsyncClient = Depends(cliente_http),
 ):
     numero = numero_ley or numeroLey
     if not numero:
@@ -216,45 +361,88 @@ async def consultar_ley(
             status_code=422,
             detail="Debes especificar `numero_ley` o `numeroLey`."
         )
-    async with httpx.AsyncClient() as client:
+    try:
         idn = await obtener_id_norma(numero, client)
-        if not idn:
-            raise HTTPException(404, f"No hallé IDNorma para ley {numero}")
-        xml = await obtener_xml_ley(idn, client)
-        if not xml:
-            raise HTTPException(503, "No pude obtener el XML de la ley.")
-    lista = extraer_articulos(xml)
+    except Exception as exc:
+        logger.warning("Error consultando el índice de LeyChile para ley %s: %r", numero, exc)
+        raise HTTPException(503, "No pude consultar el índice de LeyChile.")
+    if not idn:
+        raise HTTPException(404, f"No hallé IDNorma para ley {numero}")
+    ley = await obtener_articulos(idn, client)
+    if ley is None:
+        raise HTTPException(503, "No pude obtener el XML de la ley.")
+    lista, indice, _ = ley
     if not lista:
         raise HTTPException(404, "No extraje artículos de la ley.")
     if articulo:
-        norm = normalizar_articulo(articulo)
-        for art in lista:
-            if art.articulo_id_interno == norm:
-                return LeyDetalle(
-                    ley=numero,
-                    id_norma=idn,
-                    articulos_totales_en_respuesta=1,
-                    articulos=[art],
-                    total_articulos_originales_en_ley=len(lista)
-                )
+        art = indice.get(normalizar_articulo(articulo))
+        if art:
+            return LeyDetalle(
+                ley=numero,
+                id_norma=idn,
+                articulos_totales_en_respuesta=1,
+                articulos=[art],
+                total_articulos_originales_en_ley=len(lista)
+            )
         raise HTTPException(404, f"No hallé artículo {articulo}")
-    out = lista if len(lista) <= MAX_ARTICULOS_RETURNED else lista[:MAX_ARTICULOS_RETURNED]
-    nota = TRUNC_LIST if len(lista) > MAX_ARTICULOS_RETURNED else None
-    return LeyDetalle(
-        ley=numero,
-        id_norma=idn,
-        articulos_totales_en_respuesta=len(out),
-        articulos=out,
-        total_articulos_originales_en_ley=len(lista),
-        nota_truncamiento_lista=nota
+    return armar_detalle(numero, idn, lista)
+
+@app.post("/leyes", response_model=LeyesDetalle, summary="Consultar varias leyes (XML)")
+async def consultar_leyes(
+    consulta: ConsultaLeyes,
+    client: httpx.AsyncClient = Depends(cliente_http),
+):
+    """Consulta varias leyes a la vez; las llamadas a LeyChile se hacen en paralelo.
+
+    Las leyes inexistentes van a `no_encontradas`; las que no se pudieron obtener
+    por un fallo de LeyChile, a `con_error`.
+    """
+    # "20.000" y "20000" son la misma ley: se deduplica por clave
+    por_clave: Dict[str, str] = {}
+    for n in consulta.numeros:
+        if numero := str(n).strip():
+            por_clave.setdefault(clave_ley(numero), numero)
+    numeros = list(por_clave.values())
+    if not numeros:
+        raise HTTPException(422, "Debes especificar al menos un número en `numeros`.")
+    if len(numeros) > MAX_LEYES_POR_CONSULTA:
+        raise HTTPException(
+            422,
+            f"Puedes consultar hasta {MAX_LEYES_POR_CONSULTA} leyes por solicitud."
+        )
+
+    async def consultar_una(numero: str) -> Optional[LeyDetalle]:
+        idn = await obtener_id_norma(numero, client)
+        if not idn:
+            return None
+        ley = await obtener_articulos(idn, client)
+        if ley is None:
+            raise HTTPException(503, "No pude obtener el XML de la ley.")
+        if not ley[0]:
+            return None
+        return armar_detalle(numero, idn, ley[0])
+
+    resultados = await asyncio.gather(
+        *(consultar_una(n) for n in numeros), return_exceptions=True
     )
+    leyes, no_encontradas, con_error = [], [], []
+    for numero, resultado in zip(numeros, resultados):
+        if isinstance(resultado, LeyDetalle):
+            leyes.append(resultado)
+        elif isinstance(resultado, Exception):
+            logger.warning("Error consultando ley %s: %r", numero, resultado)
+            con_error.append(numero)
+        else:
+            no_encontradas.append(numero)
+    return LeyesDetalle(leyes=leyes, no_encontradas=no_encontradas, con_error=con_error)
 
 @app.get("/ley_html", response_model=ArticuloHTML, summary="Consultar artículo (HTML scraping)")
 async def consultar_articulo_html(
     id_norma: Optional[str] = Query(None, description="IDNorma (snake_case)"),
     idNorma:   Optional[str] = Query(None, description="IDNorma (camelCase)"),
     id_parte:  Optional[str] = Query(None, description="IdParte (snake_case)"),
-    idParte:   Optional[str] = Query(None, description="IdParte (camelCase)")
+    idParte:   Optional[str] = Query(None, description="IdParte (camelCase)"),
+    client: httpx.AsyncClient = Depends(cliente_http),
 ):
     inorma = id_norma or idNorma
     iparte = id_parte or idParte
@@ -264,40 +452,72 @@ async def consultar_articulo_html(
             detail="Debes pasar `id_norma` o `idNorma` Y `id_parte` o `idParte`."
         )
     url = f"https://www.bcn.cl/leychile/navegar?idNorma={inorma}&idParte={iparte}"
-    async with httpx.AsyncClient() as client:
-        try:
-            r = await client.get(url, timeout=10)
-            r.raise_for_status()
-        except httpx.HTTPStatusError as exc:
-            logger.warning(
-                "Código %s al obtener HTML: %s",
-                exc.response.status_code,
-                exc.request.url,
-            )
-            raise HTTPException(502, "Error al obtener HTML de la BCN")
-        except httpx.RequestError as exc:
-            logger.warning("Error de conexión al obtener HTML: %s", exc.request.url)
-            raise HTTPException(503, "No pude conectarme a la BCN")
-        soup = BeautifulSoup(r.text, "html.parser")
-        sel = soup.select_one(f"div.textoNorma[id*='{iparte}'], div[id*='{iparte}']")
-        if not sel:
-            return ArticuloHTML(
-                idNorma=inorma,
-                idParte=iparte,
-                url_fuente=url,
-                selector_usado="ninguno",
-                texto_html_extraido=f"⚠️ No encontré el artículo. Sigue este enlace:\n{url}"
-            )
-        txt = limpiar_texto(sel.get_text("\n"))
-        if len(txt) > MAX_TEXT_LENGTH:
-            txt = txt[:MAX_TEXT_LENGTH] + TRUNC_TEXT
+    try:
+        r = await client.get(url, timeout=10)
+        r.raise_for_status()
+    except httpx.HTTPStatusError as exc:
+        logger.warning(
+            "Código %s al obtener HTML: %s",
+            exc.response.status_code,
+            exc.request.url,
+        )
+        raise HTTPException(502, "Error al obtener HTML de la BCN")
+    except httpx.RequestError as exc:
+        logger.warning("Error de conexión al obtener HTML: %s", exc.request.url)
+        raise HTTPException(503, "No pude conectarme a la BCN")
+    try:
+        doc = html.fromstring(r.content, parser=html.HTMLParser(encoding=r.encoding))
+        sel = next(iter(XPATH_DIV_PARTE(doc, parte=iparte)), None)
+    except (etree.ParserError, ValueError):
+        sel = None
+    if sel is None:
         return ArticuloHTML(
             idNorma=inorma,
             idParte=iparte,
             url_fuente=url,
-            selector_usado=sel.name + (f"#{sel.get('id')}" if sel.get("id") else ""),
-            texto_html_extraido=txt
+            selector_usado="ninguno",
+            texto_html_extraido=f"⚠️ No encontré el artículo. Sigue este enlace:\n{url}"
         )
+    txt = recortar_texto("\n".join(XPATH_TEXTO_VISIBLE(sel)))
+    return ArticuloHTML(
+        idNorma=inorma,
+        idParte=iparte,
+        url_fuente=url,
+        selector_usado=sel.tag + (f"#{sel.get('id')}" if sel.get("id") else ""),
+        texto_html_extraido=txt
+    )
+
+def verificar_token_cache(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Exige el header `X-Admin-Token` igual a CACHE_ADMIN_TOKEN; sin token configurado, deshabilitado."""
+    esperado = os.getenv("CACHE_ADMIN_TOKEN")
+    if not esperado:
+        raise HTTPException(403, "Invalidación de caché deshabilitada (falta CACHE_ADMIN_TOKEN).")
+    # En bytes: compare_digest rechaza str no ASCII con TypeError (sería un 500)
+    if not x_admin_token or not secrets.compare_digest(x_admin_token.encode(), esperado.encode()):
+        raise HTTPException(401, "Token de administración inválido.")
+
+@app.post(
+    "/cache/invalidar/{numero_ley}",
+    response_model=CacheInvalidada,
+    summary="Invalidar caché de una ley",
+    dependencies=[Depends(verificar_token_cache)],
+)
+async def invalidar_cache(numero_ley: str):
+    """Descarta los artículos en caché de la ley; la próxima consulta vuelve a LeyChile.
+
+    El IdNorma se conserva (no cambia al modificarse la ley). La invalidación se
+    registra en CACHE_DIR, así los demás workers que lo comparten descartan su copia
+    al próximo uso; `invalidado` indica si este worker tenía la ley en caché. Es
+    `async` para correr en el event loop junto a las escrituras de `cache_articulos`
+    (TTLCache no es thread-safe).
+    """
+    clave = clave_ley(numero_ley)
+    idn = cache_id_norma.get(clave) or ids_en_disco.get(clave)
+    if idn is not None:
+        # Pasado TTL_ARTICULOS ningún worker conserva copias anteriores
+        invalidaciones_en_disco.set(idn, time.time(), expire=TTL_ARTICULOS)
+    invalidado = idn is not None and cache_articulos.pop(idn, None) is not None
+    return CacheInvalidada(ley=numero_ley, id_norma=idn, invalidado=invalidado)
 
 @app.get("/health", summary="Estado del servicio")
 def health():
@@ -306,5 +526,6 @@ def health():
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port)
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)
 
@@ -0,0 +1,183 @@
+# parseo.py
+# Parseo y normalización de artículos de LeyChile, sin efectos al importarse:
+# el pool de procesos de main.py importa solo este módulo.
+
+import re
+from functools import lru_cache
+from typing import Optional, List, Dict, Tuple, Any
+
+from lxml import etree
+
+# --- Constantes ---
+ROMAN_TO_INT = {
+    "i":1,"ii":2,"iii":3,"iv":4,"v":5,"vi":6,"vii":7,"viii":8,"ix":9,"x":10
+}
+WORDS_TO_INT = {
+    "primero":"1","segundo":"2","tercero":"3","cuarto":"4","quinto":"5",
+    "sexto":"6","séptimo":"7","octavo":"8","noveno":"9","décimo":"10"
+}
+MAX_TEXT_LENGTH = 10000
+TRUNC_TEXT = "\n\n[... texto truncado ...]"
+
+SIN_ORDINALES = str.maketrans("", "", "º°ª.,")
+PREFIJOS_ARTICULO = ("artículo", "articulo")
+# Sufijos que pueden ir separados del número ("23 bis"); cualquier otra palabra no es parte del id
+SUFIJOS_ARTICULO = (
+    "bis", "ter", "quater", "quáter", "quinquies", "sexies",
+    "septies", "octies", "nonies", "decies",
+)
+
+# --- Expresiones regulares (compiladas una sola vez) ---
+RE_PREFIJO_ARTICULO = re.compile(r"^(artículo|articulo)\s*")
+RE_PARTES_NUMERO    = re.compile(r"(\d+)([a-z]*)(?:\s+(" + "|".join(SUFIJOS_ARTICULO) + r"|[a-z])\b)?")
+RE_ESPACIOS         = re.compile(r"[ \t]+")
+RE_LINEAS_VACIAS    = re.compile(r"\n\s*\n+")
+RE_REFERENCIAS      = re.compile(r"ley\s+N[°º]?\s*\d+(?:\.\d+)*|art[íi]culo\s+\d+", re.IGNORECASE)
+# "Artículo 1°.-", "Art. 5.", "Artículo 23 bis:" -> (encabezado, cuerpo)
+RE_ENCABEZADO       = re.compile(
+    r"^\s*((?:art(?:[íi]culo|\.)?\s*)?[\w\sº°ª]+?)\s*(?:\.\s*-|[:\-–—.\n])\s*(.*)$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Opciones del parser XML: no materializa comentarios ni PIs. Los espacios entre
+# tags se conservan: dentro de <Texto> separan palabras (`<b>Artículo</b> <i>1</i>`)
+OPCIONES_XML = dict(
+    recover=True,
+    remove_comments=True,
+    remove_pis=True,
+)
+# El índice de búsqueda de IdNorma no tiene texto mixto: ahí sí se descartan
+OPCIONES_XML_INDICE = dict(OPCIONES_XML, remove_blank_text=True)
+
+# Texto completo del primer <Texto> de un EstructuraFuncional (con o sin namespace)
+XPATH_TEXTO_ARTICULO = etree.XPath("string((.//*[local-name()='Texto'])[1])")
+
+# Primer <div> cuyo id contiene el idParte (en orden de documento)
+XPATH_DIV_PARTE = etree.XPath("(//div[contains(@id, $parte)])[1]")
+XPATH_TEXTO_VISIBLE = etree.XPath(".//text()[not(ancestor::script or ancestor::style)]")
+
+# Internamente los artículos viajan como dicts con los campos de `Articulo`; la
+# validación Pydantic ocurre solo al armar la respuesta en main.py.
+DatosArticulo = Dict[str, Any]
+
+# --- Normalización y limpieza ---
+def normalizar_simple(s: str) -> Optional[str]:
+    """Caso común (`15`, `1°`, `3bis`, `23 bis`) en un solo recorrido; None si requiere el camino con regex."""
+    if s.isdigit():
+        return s
+    if s.startswith(PREFIJOS_ARTICULO):
+        s = s[len("artículo"):].lstrip()  # ambos prefijos miden lo mismo
+    digitos = []
+    letras = []
+    espacio = False
+    for ch in s:
+        if "0" <= ch <= "9" and not letras and not espacio:
+            digitos.append(ch)
+        elif ch == " " and digitos and not letras and not espacio:
+            espacio = True
+        elif "a" <= ch <= "z" and digitos:
+            letras.append(ch)
+        elif ch not in "º°ª.,":
+            return None
+    sufijo = "".join(letras)
+    if espacio and sufijo and sufijo not in SUFIJOS_ARTICULO and len(sufijo) > 1:
+        return None  # "3 los ...": la palabra no es sufijo; lo resuelve el camino con regex
+    return "".join(digitos) + sufijo if digitos else None
+
+@lru_cache(maxsize=8192)
+def normalizar_articulo(num_str: Optional[str]) -> str:
+    if not num_str:
+        return "s/n"
+    s = num_str.lower().strip()
+    if (simple := normalizar_simple(s)) is not None:
+        return simple
+    s = RE_PREFIJO_ARTICULO.sub("", s).translate(SIN_ORDINALES).strip()
+    if s in WORDS_TO_INT:
+        return WORDS_TO_INT[s]
+    if s in ROMAN_TO_INT:
+        return str(ROMAN_TO_INT[s])
+    nums = RE_PARTES_NUMERO.findall(s)
+    comps = [n + t + sufijo for n, t, sufijo in nums]
+    return "".join(comps) or s
+
+def limpiar_texto(txt: str) -> str:
+    txt = RE_ESPACIOS.sub(" ", txt)
+    txt = RE_LINEAS_VACIAS.sub("\n", txt)
+    return "\n".join(line.strip() for line in txt.splitlines()).strip()
+
+def recortar_texto(txt: str) -> str:
+    """limpiar_texto + truncado a MAX_TEXT_LENGTH; en textos enormes limpia solo un prefijo.
+
+    Limpiar un prefijo da un prefijo del texto limpio completo, así que basta con
+    agrandarlo hasta tener más de MAX_TEXT_LENGTH caracteres limpios.
+    """
+    limite = 2 * MAX_TEXT_LENGTH
+    while len(txt) > limite:
+        limpio = limpiar_texto(txt[:limite])
+        if len(limpio) > MAX_TEXT_LENGTH:
+            return limpio[:MAX_TEXT_LENGTH] + TRUNC_TEXT
+        limite *= 2  # prefijo casi todo espacios: se pide más texto
+    limpio = limpiar_texto(txt)
+    if len(limpio) > MAX_TEXT_LENGTH:
+        return limpio[:MAX_TEXT_LENGTH] + TRUNC_TEXT
+    return limpio
+
+def extraer_referencias(txt: str) -> List[str]:
+    return sorted({m.group(0).strip() for m in RE_REFERENCIAS.finditer(txt)})
+
+def buscar_id_en_fragmento(xml_data: bytes, clave: str) -> Optional[str]:
+    """Atajo: ubica `<Numero>clave</Numero>` en los bytes y parsea solo esa <Norma>."""
+    pos = xml_data.find(f"<Numero>{clave}</Numero>".encode())
+    if pos < 0:
+        return None
+    inicio = max(xml_data.rfind(b"<Norma>", 0, pos), xml_data.rfind(b"<Norma ", 0, pos))
+    fin = xml_data.find(b"</Norma>", pos)
+    if inicio < 0 or fin < 0:
+        return None
+    try:
+        norma = etree.fromstring(xml_data[inicio:fin + len(b"</Norma>")])
+    except etree.XMLSyntaxError:
+        return None
+    return (norma.findtext("{*}IdNorma") or "").strip() or None
+
+# --- Extracción desde el XML ---
+def nuevo_parser_articulos() -> etree.XMLPullParser:
+    return etree.XMLPullParser(events=("end",), tag="{*}EstructuraFuncional", **OPCIONES_XML)
+
+def extraer_articulos(parser: etree.XMLPullParser) -> List[Tuple[Optional[str], str]]:
+    """(idParte, texto) de los artículos completados en el parser desde la última llamada."""
+    crudos = []
+    for _, ef in parser.read_events():
+        if "artículo" in (ef.get("tipoParte") or "").lower():
+            crudos.append((ef.get("idParte"), str(XPATH_TEXTO_ARTICULO(ef))))
+        ef.clear()
+        # clear() deja el nodo vacío en el árbol; se sueltan los hermanos ya procesados
+        while ef.getprevious() is not None:
+            del ef.getparent()[0]
+    return crudos
+
+def construir_articulos(crudos: List[Tuple[Optional[str], str]]) -> List[DatosArticulo]:
+    """Separa encabezado y cuerpo, normaliza y limpia; corre en el pool de procesos."""
+    arts = []
+    for idp, txt in crudos:
+        m = RE_ENCABEZADO.match(txt)
+        disp = m.group(1).strip() if m else txt[:20]
+        body = m.group(2).strip() if m else ""
+        norm = normalizar_articulo(disp)
+        limpio = recortar_texto(body or disp)
+        refs = extraer_referencias(limpio)
+        arts.append({
+            "articulo_display": disp,
+            "articulo_id_interno": norm,
+            "texto": limpio,
+            "referencias_legales": refs,
+            "id_parte_xml": idp,
+        })
+    return arts
+
+def indexar_articulos(arts: List[DatosArticulo]) -> Dict[str, DatosArticulo]:
+    """Índice `articulo_id_interno -> artículo`; ante duplicados gana el primero."""
+    indice: Dict[str, DatosArticulo] = {}
+    for art in arts:
+        indice.setdefault(art["articulo_id_interno"], art)
+    return indice
@@ -1,25 +1,32 @@
-import sys, os
+import sys, os, time, asyncio
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import httpx
+import pytest
 from fastapi.testclient import TestClient
-from main import app
+from main import app, cache_articulos, cliente_http, MAX_LEYES_POR_CONSULTA
 
-client = TestClient(app)
 
+@pytest.fixture(scope="module")
+def client():
+    # El context manager ejecuta el lifespan (cliente HTTP compartido, pool de parseo)
+    with TestClient(app) as c:
+        yield c
 
-def test_root():
+
+def test_root(client):
     response = client.get("/")
     assert response.status_code == 200
     data = response.json()
     assert "mensaje" in data
     assert "version" in data
 
-def test_health():
+def test_health(client):
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
 
 
-def test_ley_articulo():
+def test_ley_articulo(client):
     params = {"numero_ley": "21595", "articulo": "1"}
     response = client.get("/ley", params=params)
     assert response.status_code == 200
@@ -30,7 +37,7 @@ def test_ley_articulo():
     assert data["articulos"][0]["texto"]
 
 
-def test_ley_html():
+def test_ley_html(client):
     params = {"id_norma": "1195119", "id_parte": "10449614"}
     response = client.get("/ley_html", params=params)
     assert response.status_code == 200
@@ -38,3 +45,86 @@ def test_ley_html():
     assert data["idNorma"] == "1195119"
     assert data["idParte"] == "10449614"
     assert data["texto_html_extraido"]
+
+
+def test_leyes_batch(client):
+    response = client.post("/leyes", json={"numeros": ["21595", "20393"]})
+    assert response.status_code == 200
+    data = response.json()
+    assert [ley["ley"] for ley in data["leyes"]] == ["21595", "20393"]
+    assert data["no_encontradas"] == []
+
+
+def test_leyes_batch_vacio(client):
+    response = client.post("/leyes", json={"numeros": []})
+    assert response.status_code == 422
+
+
+def test_invalidar_cache(client, monkeypatch):
+    monkeypatch.setenv("CACHE_ADMIN_TOKEN", "secreto")
+    assert client.post("/cache/invalidar/21595").status_code == 401
+    # Header no ASCII (llega como str latin-1): 401, no un TypeError de compare_digest
+    assert client.post("/cache/invalidar/21595", headers={"X-Admin-Token": b"caf\xe9"}).status_code == 401
+    headers = {"X-Admin-Token": "secreto"}
+    # 21595 -> 1195119 viene de fallbacks.json; se siembra la caché para no depender de la red
+    cache_articulos["1195119"] = ([], {}, time.time())
+    response = client.post("/cache/invalidar/21595", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["ley"] == "21595"
+    assert data["id_norma"] == "1195119"
+    assert data["invalidado"] is True
+    response = client.post("/cache/invalidar/21595", headers=headers)
+    assert response.json()["invalidado"] is False
+
+
+def test_invalidar_cache_sin_token_configurado(client, monkeypatch):
+    monkeypatch.delenv("CACHE_ADMIN_TOKEN", raising=False)
+    response = client.post("/cache/invalidar/21595", headers={"X-Admin-Token": "x"})
+    assert response.status_code == 403
+
+
+def test_leyes_batch_acepta_enteros(client):
+    # Números enteros se aceptan (no 422 de validación); al pasar el límite responde el chequeo propio
+    response = client.post("/leyes", json={"numeros": list(range(1, MAX_LEYES_POR_CONSULTA + 2))})
+    assert response.status_code == 422
+    assert "hasta" in response.json()["detail"]
+
+
+def test_invalidacion_registrada_por_otro_worker(client):
+    import main
+    xml = ('<Norma><EstructuraFuncional idParte="1" tipoParte="Artículo">'
+           '<Texto>Artículo 1.- Texto nuevo.</Texto></EstructuraFuncional></Norma>').encode("utf-8")
+    transporte = httpx.MockTransport(lambda request: httpx.Response(200, content=xml))
+    viejo = ([], {}, time.time() - 10)
+    cache_articulos["1"] = viejo
+    # Otro worker registró la invalidación en el CACHE_DIR compartido
+    main.invalidaciones_en_disco.set("1", time.time())
+
+    async def consultar():
+        async with httpx.AsyncClient(transport=transporte) as c:
+            return await main.obtener_articulos("1", c)
+
+    try:
+        ley = asyncio.run(consultar())
+        assert ley is not viejo
+        assert [a["texto"] for a in ley[0]] == ["Texto nuevo."]
+    finally:
+        main.invalidaciones_en_disco.delete("1")
+        cache_articulos.pop("1", None)
+
+
+def test_leyes_batch_con_error_de_leychile(client):
+    # LeyChile caído: la ley (IdNorma conocido por fallbacks.json) se informa como error, no como inexistente
+    caido = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+    cache_articulos.pop("1195119", None)
+    app.dependency_overrides[cliente_http] = lambda: caido
+    try:
+        response = client.post("/leyes", json={"numeros": ["21595"]})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    data = response.json()
+    assert data["leyes"] == []
+    assert data["no_encontradas"] == []
+    assert data["con_error"] == ["21595"]
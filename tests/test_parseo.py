@@ -0,0 +1,124 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from parseo import nuevo_parser_articulos, extraer_articulos, construir_articulos, normalizar_articulo
+from parseo import buscar_id_en_fragmento, limpiar_texto, recortar_texto, MAX_TEXT_LENGTH, TRUNC_TEXT
+from main import obtener_pool, reiniciar_pool
+
+XML_LEY = """<?xml version="1.0" encoding="utf-8"?>
+<Norma xmlns="http://www.leychile.cl/esquemas" normaId="1195119">
+  <EstructurasFuncionales>
+    <EstructuraFuncional idParte="100" tipoParte="Título">
+      <Texto>TÍTULO I</Texto>
+      <EstructurasFuncionales>
+        <EstructuraFuncional idParte="101" tipoParte="Artículo">
+          <Texto>Artículo 1.- Esta ley regula lo dispuesto en la Ley N° 19.880.</Texto>
+        </EstructuraFuncional>
+        <EstructuraFuncional idParte="102" tipoParte="Artículo">
+          <Texto>Artículo 2.- Véase el artículo 1.</Texto>
+        </EstructuraFuncional>
+      </EstructurasFuncionales>
+    </EstructuraFuncional>
+  </EstructurasFuncionales>
+</Norma>
+""".encode("utf-8")
+
+
+def test_extraer_articulos_xml_con_namespace():
+    parser = nuevo_parser_articulos()
+    parser.feed(XML_LEY)
+    parser.close()
+    arts = construir_articulos(extraer_articulos(parser))
+    assert [a["id_parte_xml"] for a in arts] == ["101", "102"]
+    assert [a["articulo_id_interno"] for a in arts] == ["1", "2"]
+    assert arts[0]["referencias_legales"] == ["Ley N° 19.880"]
+    assert arts[1]["referencias_legales"] == ["artículo 1"]
+
+
+def test_extraer_articulos_por_trozos():
+    parser = nuevo_parser_articulos()
+    crudos = []
+    for i in range(0, len(XML_LEY), 16):
+        parser.feed(XML_LEY[i:i + 16])
+        crudos.extend(extraer_articulos(parser))
+    parser.close()
+    crudos.extend(extraer_articulos(parser))
+    assert [idp for idp, _ in crudos] == ["101", "102"]
+
+
+def test_normalizar_articulo_bis_con_espacio():
+    assert normalizar_articulo("15") == "15"
+    assert normalizar_articulo("23 bis") == "23bis"
+    assert normalizar_articulo("Artículo 5 ter") == "5ter"
+    # El camino con regex tampoco debe perder el sufijo separado por espacio
+    for entrada in ("Art. 23 bis", "art 23 bis", "N° 23 bis", "23 bis A", "Artículo 23 bis transitorio"):
+        assert normalizar_articulo(entrada) == "23bis"
+    assert normalizar_articulo("décimo") == "10"
+
+
+def test_construir_articulos_encabezados():
+    arts = construir_articulos([
+        ("1", "Artículo 1°.- La ley rige."),
+        ("2", "Art. 2. Texto del Código."),
+    ])
+    assert [a["articulo_id_interno"] for a in arts] == ["1", "2"]
+    assert [a["texto"] for a in arts] == ["La ley rige.", "Texto del Código."]
+
+
+def test_pool_se_recrea_tras_caerse():
+    pool = obtener_pool()
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+    reiniciar_pool(pool)
+    nuevo = obtener_pool()
+    assert nuevo is not pool
+    assert nuevo.submit(abs, -3).result() == 3
+    reiniciar_pool(nuevo)
+
+
+def test_recortar_texto_con_mucho_espacio():
+    # El acotado previo no debe devolver menos texto útil que limpiar todo y truncar
+    txt = ("palabra" + " " * 10) * 2000
+    esperado = limpiar_texto(txt)[:MAX_TEXT_LENGTH] + TRUNC_TEXT
+    assert recortar_texto(txt) == esperado
+
+
+def test_extraer_articulos_conserva_espacios_entre_tags():
+    xml = ('<Norma><EstructuraFuncional idParte="1" tipoParte="Artículo">'
+           '<Texto><b>Artículo</b> <i>1</i>.- Hola</Texto></EstructuraFuncional></Norma>').encode("utf-8")
+    parser = nuevo_parser_articulos()
+    parser.feed(xml)
+    parser.close()
+    assert extraer_articulos(parser) == [("1", "Artículo 1.- Hola")]
+
+
+INDICE_NORMAS = b"""<?xml version="1.0" encoding="utf-8"?>
+<Normas xmlns="http://www.leychile.cl/esquemas">
+  <Norma><Numero>20000</Numero><IdNorma>235507</IdNorma></Norma>
+  <Norma><Numero>21595</Numero><IdNorma>1195119</IdNorma></Norma>
+</Normas>"""
+
+
+def test_buscar_id_en_fragmento():
+    # Acierto: la raíz declara un namespace por defecto que el fragmento recortado no trae
+    assert buscar_id_en_fragmento(INDICE_NORMAS, "21595") == "1195119"
+    assert buscar_id_en_fragmento(INDICE_NORMAS, "19880") is None
+    # Casos que deben caer al iterparse completo (None, no un ID erróneo)
+    assert buscar_id_en_fragmento(b"<Normas><Norma><Numero>21.595</Numero><IdNorma>1</IdNorma></Norma></Normas>", "21595") is None
+    assert buscar_id_en_fragmento(b"<n:Normas xmlns:n='x'><n:Norma><n:Numero>21595</n:Numero><n:IdNorma>1</n:IdNorma></n:Norma></n:Normas>", "21595") is None
+    assert buscar_id_en_fragmento(b"<Normas><Norma><Numero>21595</Numero></Norma></Normas>", "21595") is None
+    assert buscar_id_en_fragmento(b"<Normas><Norma><Numero>21595</Numero><IdNorma> </IdNorma></Norma></Normas>", "21595") is None
+    # Fragmento truncado (sin </Norma>)
+    assert buscar_id_en_fragmento(b"<Normas><Norma><Numero>21595</Numero><IdNorma>1", "21595") is None
+
+
+def test_encabezado_sin_separador_no_pega_palabras_al_id():
+    arts = construir_articulos([
+        ("1", "Artículo 3 Los servicios públicos deberán informar."),
+        ("2", "Artículo 5 de la presente ley: texto."),
+        ("3", "Artículo 3 Derógase la ley."),
+    ])
+    assert [a["articulo_id_interno"] for a in arts] == ["3", "5", "3"]
+    assert normalizar_articulo("3 los") == "3"
+    assert normalizar_articulo("Artículo 5 quáter") == "5quáter"